@@ -1,20 +1,130 @@
 # TradingBot.py - With trade limit and strategy selection
 import MetaTrader5 as mt5
-import pandas as pd
+import numpy as np
+from numba import njit
 import time
 import logging
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Bar layout used internally: OHLC as float32. FX/gold quotes carry ~6
+# significant digits, so float32 is ample for indicator math and halves
+# the bytes every kernel touches. Prices sent back to MT5 stay float64.
+_RATES_DTYPE = np.dtype([('time', 'i8'), ('open', 'f4'), ('high', 'f4'),
+                         ('low', 'f4'), ('close', 'f4'), ('tick_volume', 'i8'),
+                         ('spread', 'i4'), ('real_volume', 'i8')])
+
+# Explicit signatures compile the kernels at import time (and cache=True
+# persists them on disk), so no trading tick ever pays JIT latency
+@njit('f4[:](f4[:], f8)', cache=True, fastmath=True)
+def ema_njit(x, alpha):
+    """EMA recurrence compiled to a tight native loop"""
+    out = np.empty_like(x)
+    out[0] = x[0]
+    for i in range(1, x.size):
+        out[i] = alpha * x[i] + (1.0 - alpha) * out[i-1]
+    return out
+
+@njit('i8(f4[:], f4[:], i8, f8)', cache=True)
+def scan_abcd(highs, lows, direction, tolerance):
+    """Fused ABCD window scan in one trend direction.
+
+    Computes the AB/BC/CD legs and Fibonacci tolerance checks inline per
+    window - no temporary arrays - and returns the first matching window
+    index, or -1 if none. direction > 0 scans bullish, < 0 bearish.
+    """
+    n = highs.size
+    last_low = lows[n-1]
+    last_high = highs[n-1]
+    for i in range(n - 4):
+        if direction > 0:
+            # Bullish: A/C swing lows, B swing high, D = latest low
+            AB = highs[i+1] - lows[i]
+            BC = highs[i+1] - lows[i+2]
+            CD = last_low - lows[i+2]
+        else:
+            # Bearish: A/C swing highs, B swing low, D = latest high
+            AB = highs[i] - lows[i+1]
+            BC = highs[i+2] - lows[i+1]
+            CD = highs[i+2] - last_high
+        if AB > 0 and BC > 0 and CD > 0:
+            # Both denominators are strictly positive here, so the ratio
+            # checks can never divide by zero even on flat price windows
+            if (abs(BC/AB - 0.618) < tolerance and
+                    abs(CD/BC - 1.618) < tolerance):
+                return i
+    return -1
+
+def _true_range(high, low, close):
+    """True range per bar (first bar uses its own close as previous close)"""
+    prev_close = np.empty_like(close)
+    prev_close[0] = close[0]
+    prev_close[1:] = close[:-1]
+    return np.maximum.reduce([high - low,
+                              np.abs(high - prev_close),
+                              np.abs(low - prev_close)])
+
+def _atr_np(high, low, close, period=14):
+    """Full ATR series in a single NumPy pass (rolling mean via cumsum)"""
+    tr = _true_range(high, low, close)
+    csum = np.concatenate(([0.0], np.cumsum(tr)))
+    atr = np.full_like(tr, np.nan)
+    atr[period-1:] = (csum[period:] - csum[:-period]) / period
+    return atr
+
+def _atr_last(high, low, close, period=14):
+    """Latest ATR value only - one reduction, no series allocation"""
+    tr = _true_range(high, low, close)
+    return tr[-period:].mean()
+
 class TradingBot:
     def __init__(self):
         self.symbols = ['USDJPYm', 'AUDUSDm', 'NZDUSDm', 'CADJPY', 'CHFJPY', 'EURJPY', 'GBPUSD', 'XAUUSD']
         self.timeframe = mt5.TIMEFRAME_M15
         self.atr_period = 14
+        self.ema_period = 50  # EMA trend filter
         self.max_concurrent_trades = 2  # Maximum trades allowed at once
         self.strategy = None
+        self._next_eval_ts = 0.0  # when the next strategy evaluation is due
+        self._open_trades = 0  # local open-trade count, refreshed from MT5 each cycle
+        # Per-symbol indicator caches: (last bar time, value[, prev close])
+        self._ema_state = {}
+        self._atr_state = {}
+        self._bars = {}  # per-symbol rolling 100-bar window, updated in place
+        # Fetch all symbols' rates concurrently; copy_rates_from_pos is a
+        # blocking IPC call so the waits overlap instead of adding up
+        self._pool = ThreadPoolExecutor(max_workers=len(self.symbols))
+        # Price action lookup table: [trend_idx, pattern bitmask] -> signal
+        # (1 = buy, -1 = sell, 0 = none). Bits: bullish pin, bullish
+        # engulfing, bearish pin, bearish engulfing. Adding a pattern is a
+        # table edit rather than another branch chain in the detector.
+        self._pa_lut = np.zeros((2, 16), dtype=np.int8)
+        for bits in range(16):
+            if bits & 0b0011:
+                self._pa_lut[0, bits] = 1   # uptrend + bullish pattern
+            if bits & 0b1100:
+                self._pa_lut[1, bits] = -1  # downtrend + bearish pattern
+        # Pre-built order payloads per symbol/side; only price, SL, TP and
+        # comment vary per trade, everything else is constant
+        self._order_tpl = {
+            sym: {
+                signal: {
+                    "action": mt5.TRADE_ACTION_DEAL,
+                    "symbol": sym,
+                    "volume": 0.1,
+                    "type": mt5.ORDER_TYPE_BUY if signal == 'buy' else mt5.ORDER_TYPE_SELL,
+                    "deviation": 10,
+                    "magic": 123456,
+                    "type_time": mt5.ORDER_TIME_GTC,
+                    "type_filling": mt5.ORDER_FILLING_IOC,
+                }
+                for signal in ('buy', 'sell')
+            }
+            for sym in self.symbols
+        }
         self.init_mt5()
         self.select_strategy()
 
@@ -47,18 +157,103 @@ class TradingBot:
             else:
                 print("Invalid selection. Please enter 1 or 2.")
 
-    def fetch_data(self, symbol):
-        """Get price data for analysis"""
+    def _refresh_bars(self, symbol):
+        """Pull the full 100-bar window and reset the cache for a symbol"""
         rates = mt5.copy_rates_from_pos(symbol, self.timeframe, 0, 100)
-        return pd.DataFrame(rates) if rates is not None else pd.DataFrame()
+        if rates is None:
+            return None
+        bars = rates.astype(_RATES_DTYPE)
+        self._bars[symbol] = bars
+        # The incremental EMA/ATR recurrences only advance one bar at a
+        # time, so after a resync (missed bars) drop the cached state and
+        # let update_indicators reseed from the fresh window
+        self._ema_state.pop(symbol, None)
+        self._atr_state.pop(symbol, None)
+        return bars
+
+    def fetch_data(self, symbol):
+        """Get price data as a float32 structured array (or None on failure).
+
+        The 100-bar window is fetched once per symbol and then maintained
+        incrementally: each cycle only the last two bars cross the MT5 IPC
+        boundary, since at most one new bar can have opened and the one
+        before it finalized. Any gap (missed bars) falls back to a full
+        refresh.
+        """
+        bars = self._bars.get(symbol)
+        if bars is None:
+            return self._refresh_bars(symbol)
+
+        tail = mt5.copy_rates_from_pos(symbol, self.timeframe, 0, 2)
+        if tail is None or len(tail) < 2:
+            return self._refresh_bars(symbol)
+        tail = tail.astype(_RATES_DTYPE)
+
+        if tail['time'][-1] == bars['time'][-1]:
+            # Same bar, still forming: splice the updated values in place
+            bars[-1] = tail[-1]
+        elif tail['time'][-2] == bars['time'][-1]:
+            # New bar opened: finalize the old last bar, shift, append
+            bars[-1] = tail[-2]
+            bars[:-1] = bars[1:]
+            bars[-1] = tail[-1]
+        else:
+            # More than one bar elapsed (startup lag, reconnect): resync
+            return self._refresh_bars(symbol)
+        return bars
 
-    def calculate_atr(self, df, period=14):
+    def calculate_ema(self, close, period=50):
+        """Calculate Exponential Moving Average for trend filtering"""
+        return ema_njit(np.ascontiguousarray(close, dtype=np.float32),
+                        2.0 / (period + 1))
+
+    def calculate_atr(self, rates, period=14):
         """Calculate Average True Range for volatility stops"""
-        high_low = df['high'] - df['low']
-        high_close = (df['high'] - df['close'].shift()).abs()
-        low_close = (df['low'] - df['close'].shift()).abs()
-        true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        return true_range.rolling(period).mean()
+        return _atr_np(rates['high'], rates['low'], rates['close'], period)
+
+    def update_indicators(self, symbol, rates):
+        """Update cached EMA/ATR for a symbol and return them as scalars.
+
+        Only the last bar changes between 60s ticks, so after a one-shot
+        seed over the full window the EWM/Wilder recurrences are O(1)
+        per new bar instead of recomputing the whole series.
+        """
+        bar_time = rates['time'][-1]
+        high = rates['high'][-1]
+        low = rates['low'][-1]
+        close = rates['close'][-1]
+
+        state = self._ema_state.get(symbol)
+        if state is None:
+            ema = self.calculate_ema(rates['close'], self.ema_period)[-1]
+        elif state[0] == bar_time:
+            ema = state[1]
+        else:
+            alpha = 2.0 / (self.ema_period + 1)
+            ema = alpha * close + (1.0 - alpha) * state[1]
+        ema = float(ema)  # cache and hand out float64 scalars
+        self._ema_state[symbol] = (bar_time, ema)
+
+        state = self._atr_state.get(symbol)
+        if state is None:
+            atr = _atr_last(rates['high'], rates['low'], rates['close'], self.atr_period)
+        elif state[0] == bar_time:
+            atr = state[1]
+        else:
+            prev_close = state[2]
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            atr = (state[1] * (self.atr_period - 1) + tr) / self.atr_period
+        atr = float(atr)  # SL/TP math downstream stays float64
+        self._atr_state[symbol] = (bar_time, atr, float(close))
+
+        return ema, atr
+
+    def _next_bar_wait(self):
+        """Seconds until just after the next M15 bar opens"""
+        now = datetime.now(timezone.utc)
+        minutes = (now.minute // 15 + 1) * 15
+        next_bar = now.replace(minute=0, second=1, microsecond=0) + timedelta(minutes=minutes)
+        return max(1.0, (next_bar - now).total_seconds())
 
     def get_current_trades(self):
         """Get count of currently open trades"""
@@ -66,142 +261,138 @@ class TradingBot:
         return len(positions) if positions else 0
 
     # ====================== ABCD PATTERN STRATEGY ======================
-    def detect_abcd_pattern(self, df, tolerance=0.618):
-        """Detect bullish/bearish ABCD harmonic patterns"""
-        if len(df) < 10:
+    def detect_abcd_pattern(self, rates, trend, tolerance=0.618):
+        """Detect bullish/bearish ABCD harmonic patterns in trend direction"""
+        if len(rates) < 10:
             return None
-            
-        highs = df['high'].values
-        lows = df['low'].values
-        
-        for i in range(len(df)-20, len(df)-4):
-            # Bullish ABCD pattern
-            A = lows[i+1]
-            B = highs[i+2]
-            C = lows[i+3]
-            D = lows[-1]
-            
-            if (B - A) > 0 and (C - B) < 0 and (D - C) > 0:
-                AB = B - A
-                BC = B - C
-                CD = D - C
-                
-                if (abs(BC/AB - 0.618) < tolerance) and (abs(CD/BC - 1.618) < tolerance):
-                    logging.info(f"Bullish ABCD pattern detected (AB={AB:.5f}, BC={BC:.5f}, CD={CD:.5f})")
-                    return 'buy'
-            
-            # Bearish ABCD pattern
-            A = highs[i+1]
-            B = lows[i+2]
-            C = highs[i+3]
-            D = highs[-1]
-            
-            if (A - B) > 0 and (C - B) > 0 and (C - D) > 0:
-                AB = A - B
-                BC = C - B
-                CD = C - D
-                
-                if (abs(BC/AB - 0.618) < tolerance) and (abs(CD/BC - 1.618) < tolerance):
-                    logging.info(f"Bearish ABCD pattern detected (AB={AB:.5f}, BC={BC:.5f}, CD={CD:.5f})")
-                    return 'sell'
-        
-        return None
+
+        highs = rates['high'][-30:]
+        lows = rates['low'][-30:]
+        direction = 1 if trend == 'up' else -1
+
+        i = scan_abcd(highs, lows, direction, tolerance)
+        if i < 0:
+            return None
+
+        # Recompute the matched window's legs only for the log line
+        if direction > 0:
+            AB = highs[i+1] - lows[i]
+            BC = highs[i+1] - lows[i+2]
+            CD = lows[-1] - lows[i+2]
+            logging.info(f"Bullish ABCD pattern detected (AB={AB:.5f}, BC={BC:.5f}, CD={CD:.5f})")
+            return 'buy'
+
+        AB = highs[i] - lows[i+1]
+        BC = highs[i+2] - lows[i+1]
+        CD = highs[i+2] - highs[-1]
+        logging.info(f"Bearish ABCD pattern detected (AB={AB:.5f}, BC={BC:.5f}, CD={CD:.5f})")
+        return 'sell'
 
     # ====================== PRICE ACTION STRATEGY ======================
-    def detect_price_action(self, df):
-        """Detect price action signals (Pin Bars, Engulfing, Inside Bars)"""
-        if len(df) < 3:
+    def detect_price_action(self, rates, trend):
+        """Detect price action signals (Pin Bars, Engulfing) in trend direction"""
+        if len(rates) < 3:
             return None
-            
-        # Get last 3 candles
-        current = df.iloc[-1]
-        prev = df.iloc[-2]
-        prev_prev = df.iloc[-3]
-        
+
+        # Last two candles as plain scalars
+        o, h, l, c = rates['open'][-1], rates['high'][-1], rates['low'][-1], rates['close'][-1]
+        po, ph, pl, pc = rates['open'][-2], rates['high'][-2], rates['low'][-2], rates['close'][-2]
+
         # Bullish Signals
-        bullish_pin = (current['close'] > current['open'] and 
-                      (current['open'] - current['low']) > 2*(current['high'] - current['close']) and
-                      (current['high'] - current['close']) < (current['close'] - current['open']))
-        
-        bullish_engulfing = (current['close'] > prev['open'] and 
-                            current['open'] < prev['close'] and 
-                            current['close'] > prev['high'] and
-                            prev['close'] < prev['open'])
-        
+        bullish_pin = (c > o and
+                       (o - l) > 2*(h - c) and
+                       (h - c) < (c - o))
+
+        bullish_engulfing = (c > po and
+                             o < pc and
+                             c > ph and
+                             pc < po)
+
         # Bearish Signals
-        bearish_pin = (current['close'] < current['open'] and 
-                      (current['high'] - current['open']) > 2*(current['close'] - current['low']) and
-                      (current['close'] - current['low']) < (current['open'] - current['high']))
-        
-        bearish_engulfing = (current['close'] < prev['open'] and 
-                             current['open'] > prev['close'] and 
-                             current['close'] < prev['low'] and
-                             prev['close'] > prev['open'])
-        
-        if bullish_pin or bullish_engulfing:
+        bearish_pin = (c < o and
+                       (h - o) > 2*(c - l) and
+                       (c - l) < (o - h))
+
+        bearish_engulfing = (c < po and
+                             o > pc and
+                             c < pl and
+                             pc > po)
+
+        # Pack pattern flags into a bitmask and dispatch through the
+        # precomputed table - no branch chain over individual patterns
+        bits = (int(bullish_pin) |
+                int(bullish_engulfing) << 1 |
+                int(bearish_pin) << 2 |
+                int(bearish_engulfing) << 3)
+        signal = self._pa_lut[0 if trend == 'up' else 1, bits]
+
+        if signal == 1:
             logging.info(f"Bullish price action detected - Pin Bar: {bullish_pin}, Engulfing: {bullish_engulfing}")
             return 'buy'
-        elif bearish_pin or bearish_engulfing:
+        elif signal == -1:
             logging.info(f"Bearish price action detected - Pin Bar: {bearish_pin}, Engulfing: {bearish_engulfing}")
             return 'sell'
-        
+
         return None
 
-    def place_order(self, symbol, signal, df):
+    def place_order(self, symbol, signal, atr):
         """Execute trade if under max concurrent trades limit"""
-        current_trades = self.get_current_trades()
+        current_trades = self._open_trades
         if current_trades >= self.max_concurrent_trades:
             logging.info(f"Max trades reached ({current_trades}/{self.max_concurrent_trades}). Skipping new trade.")
             return False
-            
+
         price = mt5.symbol_info_tick(symbol).ask if signal == 'buy' else mt5.symbol_info_tick(symbol).bid
-        lot = 0.1
-        atr = df['atr'].iloc[-1] if 'atr' in df.columns else self.calculate_atr(df, self.atr_period).iloc[-1]
-        
+
         # Risk management
         sl = price - atr * 2 if signal == 'buy' else price + atr * 2
         tp = price + atr * 3 if signal == 'buy' else price - atr * 3
 
-        request = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "volume": lot,
-            "type": mt5.ORDER_TYPE_BUY if signal == 'buy' else mt5.ORDER_TYPE_SELL,
-            "price": price,
-            "sl": sl,
-            "tp": tp,
-            "deviation": 10,
-            "magic": 123456,
-            "comment": f"{self.strategy}_{signal}",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
-        }
+        request = self._order_tpl[symbol][signal].copy()
+        request["price"] = price
+        request["sl"] = sl
+        request["tp"] = tp
+        request["comment"] = f"{self.strategy}_{signal}"
 
         result = mt5.order_send(request)
         if result.retcode != mt5.TRADE_RETCODE_DONE:
             logging.error(f"Order failed: {result.retcode}")
             return False
         else:
-            logging.info(f"{self.strategy.upper()} Trade: {symbol} {signal.upper()} at {price} (Trade {current_trades+1}/{self.max_concurrent_trades})")
+            self._open_trades += 1
+            logging.info(f"{self.strategy.upper()} Trade: {symbol} {signal.upper()} at {price} (Trade {self._open_trades}/{self.max_concurrent_trades})")
             return True
 
     def manage_trades(self):
         """Manage open positions with trailing stops"""
-        positions = mt5.positions_get()
-        for pos in positions:
-            current_price = mt5.symbol_info_tick(pos.symbol).bid if pos.type == 0 else mt5.symbol_info_tick(pos.symbol).ask
-            
-            # Move SL to breakeven + 0.5x ATR after 1.5x initial risk
-            if pos.type == 0:  # Buy position
-                if current_price > pos.price_open + (pos.price_open - pos.sl) * 1.5:
-                    new_sl = pos.price_open + (pos.price_open - pos.sl) * 0.5
-                    if new_sl > pos.sl:
-                        self.modify_sl(pos, new_sl)
-            else:  # Sell position
-                if current_price < pos.price_open - (pos.sl - pos.price_open) * 1.5:
-                    new_sl = pos.price_open - (pos.sl - pos.price_open) * 0.5
-                    if new_sl < pos.sl:
-                        self.modify_sl(pos, new_sl)
+        positions = mt5.positions_get() or ()
+        # Keep the local counter honest with externally closed positions
+        self._open_trades = len(positions)
+        if not positions:
+            return
+
+        # One tick fetch per unique symbol, dispatched concurrently,
+        # instead of one RPC inside the per-position loop
+        symbols = list({pos.symbol for pos in positions})
+        ticks = dict(zip(symbols, self._pool.map(mt5.symbol_info_tick, symbols)))
+
+        price_open = np.array([pos.price_open for pos in positions])
+        sl = np.array([pos.sl for pos in positions])
+        is_buy = np.array([pos.type == 0 for pos in positions])
+        price = np.array([ticks[pos.symbol].bid if pos.type == 0 else ticks[pos.symbol].ask
+                          for pos in positions])
+
+        # Move SL to breakeven + 0.5x initial risk after 1.5x initial risk
+        risk = np.where(is_buy, price_open - sl, sl - price_open)
+        trigger = np.where(is_buy,
+                           price > price_open + risk * 1.5,
+                           price < price_open - risk * 1.5)
+        new_sl = np.where(is_buy, price_open + risk * 0.5, price_open - risk * 0.5)
+        improves = np.where(is_buy, new_sl > sl, new_sl < sl)
+
+        for i, pos in enumerate(positions):
+            if trigger[i] and improves[i]:
+                self.modify_sl(pos, float(new_sl[i]))
 
     def modify_sl(self, position, new_sl):
         """Modify stop loss of an open position"""
@@ -221,36 +412,47 @@ class TradingBot:
         logging.info(f"Starting Trading Bot with {self.strategy.upper()} strategy (Max {self.max_concurrent_trades} concurrent trades)")
         try:
             while True:
-                current_trades = self.get_current_trades()
-                logging.info(f"Current open trades: {current_trades}/{self.max_concurrent_trades}")
-                
-                if current_trades < self.max_concurrent_trades:
-                    for symbol in self.symbols:
-                        df = self.fetch_data(symbol)
-                        if df.empty:
-                            continue
-                            
-                        df['atr'] = self.calculate_atr(df, self.atr_period)
-                        
-                        if self.strategy == 'abcd':
-                            signal = self.detect_abcd_pattern(df)
-                        elif self.strategy == 'price_action':
-                            signal = self.detect_price_action(df)
-                        
-                        if signal in ['buy', 'sell']:
-                            self.place_order(symbol, signal, df)
-                            # Check if we've reached max trades after this order
-                            if self.get_current_trades() >= self.max_concurrent_trades:
-                                break
-                
+                # Strategy evaluation only when a new M15 bar can exist;
+                # trade management keeps its own faster cadence below
+                if time.time() >= self._next_eval_ts:
+                    self._next_eval_ts = time.time() + self._next_bar_wait()
+                    self.evaluate_symbols()
+
                 self.manage_trades()
-                time.sleep(60)
-                
+                time.sleep(5)
+
         except KeyboardInterrupt:
             logging.info("Shutting down trading bot...")
         finally:
             mt5.shutdown()
 
+    def evaluate_symbols(self):
+        """Fetch data and dispatch strategy signals for all symbols"""
+        self._open_trades = self.get_current_trades()
+        logging.info(f"Current open trades: {self._open_trades}/{self.max_concurrent_trades}")
+
+        if self._open_trades < self.max_concurrent_trades:
+            futures = {symbol: self._pool.submit(self.fetch_data, symbol)
+                       for symbol in self.symbols}
+            for symbol, future in futures.items():
+                rates = future.result()
+                if rates is None or len(rates) == 0:
+                    continue
+
+                ema, atr = self.update_indicators(symbol, rates)
+                trend = 'up' if rates['close'][-1] > ema else 'down'
+
+                if self.strategy == 'abcd':
+                    signal = self.detect_abcd_pattern(rates, trend)
+                elif self.strategy == 'price_action':
+                    signal = self.detect_price_action(rates, trend)
+
+                if signal in ['buy', 'sell']:
+                    self.place_order(symbol, signal, atr)
+                    # Check if we've reached max trades after this order
+                    if self._open_trades >= self.max_concurrent_trades:
+                        break
+
 if __name__ == "__main__":
     bot = TradingBot()
     bot.run()
\ No newline at end of file
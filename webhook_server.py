@@ -1,32 +1,65 @@
 # webhook_server.py
+#
+# Production serving (concurrent workers, not the Flask dev server):
+#   gunicorn -k gevent -w 2 --worker-connections 500 -b 0.0.0.0:4242 webhook_server:app
 from flask import Flask, request, jsonify
-import json, hmac, hashlib
+import fcntl, json, hmac, hashlib, os, sqlite3, time
 
 app = Flask(__name__)
 
-STRIPE_WEBHOOK_SECRET = "whsec_..."  # Replace with your real Stripe webhook secret
-USERS_FILE = "users.json"
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "whsec_...")
+WEBHOOK_SECRET_BYTES = STRIPE_WEBHOOK_SECRET.encode()
+SIGNATURE_TOLERANCE = 300  # seconds, same window the Stripe SDK uses
+USERS_FILE = "users.json"  # legacy store, imported into users.db at startup
+USERS_DB = "users.db"
 
-def update_subscription(email):
+conn = sqlite3.connect(USERS_DB, check_same_thread=False, isolation_level=None)
+conn.execute("PRAGMA journal_mode=WAL")
+conn.execute("CREATE TABLE IF NOT EXISTS users ("
+             "email TEXT PRIMARY KEY, password TEXT, subscribed INTEGER DEFAULT 0)")
+
+def migrate_legacy_users():
+    # One-time import of the old users.json store; lock it so a legacy
+    # writer mid-rewrite can't hand us a torn read
+    if not os.path.isfile(USERS_FILE):
+        return
     with open(USERS_FILE, "r") as f:
-        users = json.load(f)
-    if email in users:
-        users[email]["subscribed"] = True
-        with open(USERS_FILE, "w") as f:
-            json.dump(users, f, indent=4)
+        fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            users = json.load(f)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    for email, data in users.items():
+        conn.execute(
+            "INSERT OR IGNORE INTO users (email, password, subscribed) VALUES (?, ?, ?)",
+            (email, data.get("password"),
+             int(bool(data.get("is_paid") or data.get("subscribed")))),
+        )
+
+migrate_legacy_users()
+
+def update_subscription(email):
+    conn.execute("UPDATE users SET subscribed=1 WHERE email=?", (email,))
 
 @app.route("/webhook", methods=["POST"])
 def stripe_webhook():
     payload = request.data
-    sig_header = request.headers.get("Stripe-Signature")
-    event = None
+    sig_header = request.headers.get("Stripe-Signature", "")
 
+    # Verify the signature with stdlib hmac before parsing any JSON
     try:
-        import stripe
-        stripe.api_key = "sk_test_..."  # Your secret key
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, STRIPE_WEBHOOK_SECRET
-        )
+        pairs = [kv.split("=", 1) for kv in sig_header.split(",")]
+        ts = next(v for k, v in pairs if k == "t")
+        # Stripe sends several v1 signatures while a secret is being
+        # rolled; accept if any of them matches
+        sigs = [v for k, v in pairs if k == "v1"]
+        expected = hmac.new(WEBHOOK_SECRET_BYTES, f"{ts}.".encode() + payload,
+                            hashlib.sha256).hexdigest()
+        if not any(hmac.compare_digest(expected, s) for s in sigs):
+            raise ValueError("signature mismatch")
+        if abs(time.time() - int(ts)) > SIGNATURE_TOLERANCE:
+            raise ValueError("timestamp outside tolerance")
+        event = json.loads(payload)
     except Exception as e:
         print("Webhook error:", str(e))
         return jsonify(success=False), 400
@@ -40,4 +73,5 @@ def stripe_webhook():
     return jsonify(success=True)
 
 if __name__ == "__main__":
+    # Local development only; use the gunicorn command above in production
     app.run(port=4242)